@@ -69,19 +69,11 @@ def _import_modules():
     global setup_onboarding, send_onboarding_dm
 
     try:
-        from bot.onboarding_dm import setup_onboarding, send_onboarding_dm  # type: ignore
-        print("✅ Import: bot.onboarding_dm")
+        from bot.onboarding import setup_onboarding, send_onboarding_dm  # type: ignore
+        print("✅ Import: bot.onboarding")
     except ModuleNotFoundError:
-        try:
-            from onboarding_dm import setup_onboarding, send_onboarding_dm  # type: ignore
-            print("✅ Import: onboarding_dm (root)")
-        except ModuleNotFoundError:
-            try:
-                from bot.onboarding import setup_onboarding, send_onboarding_dm  # type: ignore
-                print("⚠️ Fallback-Import: bot.onboarding")
-            except ModuleNotFoundError:
-                from onboarding import setup_onboarding, send_onboarding_dm  # type: ignore
-                print("⚠️ Fallback-Import: onboarding (root)")
+        from onboarding import setup_onboarding, send_onboarding_dm  # type: ignore
+        print("✅ Import: onboarding (root)")
 
     global register_join_hook
 
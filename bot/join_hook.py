@@ -3,51 +3,101 @@
 # und Merker-Löschung bei Leave (damit Rejoin wieder DM bekommt).
 
 from __future__ import annotations
-import json
+import asyncio
+import contextlib
+import logging
 from pathlib import Path
 from typing import Callable, Awaitable, Set
 
 try:
-    from bot.json_store import load_json_file, save_json_atomic, warn_json_store  # type: ignore
+    from bot.json_store import load_json_shared, save_json_atomic  # type: ignore
 except Exception:
-    from json_store import load_json_file, save_json_atomic, warn_json_store  # type: ignore
+    from json_store import load_json_shared, save_json_atomic  # type: ignore
+
+try:
+    from bot.queued_log import setup_queued_logger  # type: ignore
+except Exception:
+    from queued_log import setup_queued_logger  # type: ignore
 
 import discord
 
+log = logging.getLogger("join_hook")
+
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 
 STATE_FILE = DATA_DIR / "onboarding_sent.json"   # {"<guild_id>": ["user_id", ...]}
 
 def _load_state() -> dict:
-    return load_json_file(STATE_FILE, {}, context=__name__)
+    return load_json_shared(STATE_FILE, {}, context=__name__)
 
 def _save_state(obj: dict) -> None:
-    save_json_atomic(STATE_FILE, obj, context=__name__)
-
-_sent_cache = _load_state()  # guild_id -> list[str user_id]
+    save_json_atomic(STATE_FILE, obj, context=__name__, skip_unchanged=True, compact=True)
+
+_sent_cache: dict | None = None  # guild_id -> list[str user_id], lazy geladen
+
+def _ensure_state() -> dict:
+    global _sent_cache
+    if _sent_cache is None:
+        _sent_cache = _load_state()
+    return _sent_cache
+
+# on_member_join und die Screening-Freischaltung (pending True->False) können
+# fast gleichzeitig eintreffen. Pro Mitglied läuft deshalb genau ein
+# Prüfen-Senden-Merken-Ablauf, sonst kämen zwei Onboarding-DMs an.
+# Eintrag = [Lock, Anzahl Nutzer]; der letzte Nutzer entfernt ihn wieder, damit
+# nicht pro Mitglied, das den Server nie verlässt, ein Lock liegen bleibt.
+_SEND_LOCKS: dict[tuple[int, int], list] = {}
+
+@contextlib.asynccontextmanager
+async def _send_lock(gid: int, uid: int):
+    key = (int(gid), int(uid))
+    entry = _SEND_LOCKS.get(key)
+    if entry is None:
+        entry = _SEND_LOCKS[key] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] <= 0 and _SEND_LOCKS.get(key) is entry:
+            _SEND_LOCKS.pop(key, None)
 
 def _already_sent(gid: int, uid: int) -> bool:
-    arr = _sent_cache.get(str(gid), [])
+    arr = _ensure_state().get(str(gid), [])
     return str(uid) in arr
 
-def _mark_sent(gid: int, uid: int) -> None:
-    arr: Set[str] = set(_sent_cache.get(str(gid), []))
+# Geschrieben wird in einem Worker-Thread; der Lock hält die Schreibvorgänge in
+# Reihenfolge, damit kein älterer Snapshot einen neueren überschreibt.
+_save_lock: asyncio.Lock | None = None
+
+async def _save_state_async() -> None:
+    global _save_lock
+    if _save_lock is None:
+        _save_lock = asyncio.Lock()
+    async with _save_lock:
+        # Listen werden nur ersetzt, nie verändert: eine flache Kopie reicht.
+        await asyncio.to_thread(_save_state, dict(_ensure_state()))
+
+async def _mark_sent(gid: int, uid: int) -> None:
+    state = _ensure_state()
+    arr: Set[str] = set(state.get(str(gid), []))
     arr.add(str(uid))
-    _sent_cache[str(gid)] = sorted(arr)
-    _save_state(_sent_cache)
+    state[str(gid)] = sorted(arr)
+    await _save_state_async()
 
-def _clear_sent(gid: int, uid: int) -> None:
-    arr: Set[str] = set(_sent_cache.get(str(gid), []))
+async def _clear_sent(gid: int, uid: int) -> None:
+    state = _ensure_state()
+    arr: Set[str] = set(state.get(str(gid), []))
     if str(uid) in arr:
         arr.remove(str(uid))
-        _sent_cache[str(gid)] = sorted(arr)
-        _save_state(_sent_cache)
+        state[str(gid)] = sorted(arr)
+        await _save_state_async()
 
 async def _try_send_onboarding(
     member: discord.Member,
-    send_onboarding_dm: Callable[[discord.Member], Awaitable[None]],
+    send_onboarding_dm: Callable[[discord.Member], Awaitable[object]],
     auto_resend_for_new_member: Callable[[discord.Member], Awaitable[None]],
     reason: str,
 ) -> None:
@@ -55,29 +105,36 @@ async def _try_send_onboarding(
         if member.bot:
             return
 
-        # Schon gesendet? -> nichts tun
-        if _already_sent(member.guild.id, member.id):
-            print(f"[join_hook] Skip: {member} bereits bedient.")
-            return
+        async with _send_lock(member.guild.id, member.id):
+            # Schon gesendet? -> nichts tun
+            if _already_sent(member.guild.id, member.id):
+                log.info("Skip: %s bereits bedient.", member)
+                return
 
-        # 1) Onboarding-DM
-        try:
-            await send_onboarding_dm(member)
-            _mark_sent(member.guild.id, member.id)
-            print(f"[join_hook] Onboarding-DM an {member} gesendet (reason={reason}).")
-        except Exception as e:
-            # NICHT markieren, damit spätere Versuche/Manuell möglich sind
-            print(f"[join_hook] Onboarding-DM an {member} fehlgeschlagen (reason={reason}): {e!r}")
+            # 1) Onboarding-DM
+            try:
+                result = await send_onboarding_dm(member)
+                # send_onboarding_dm meldet übersprungene/fehlgeschlagene DMs als (False, Grund)
+                # statt per Exception; dann NICHT markieren, sonst bekäme das Mitglied die
+                # DM auch später nie (z. B. sobald die Onboarding-Rollen gesetzt sind).
+                if isinstance(result, tuple) and result and not result[0]:
+                    log.info("Onboarding-DM an %s nicht gesendet (reason=%s): %s", member, reason, result[1] if len(result) > 1 else "—")
+                else:
+                    await _mark_sent(member.guild.id, member.id)
+                    log.info("Onboarding-DM an %s gesendet (reason=%s).", member, reason)
+            except Exception as e:
+                # NICHT markieren, damit spätere Versuche/Manuell möglich sind
+                log.warning("Onboarding-DM an %s fehlgeschlagen (reason=%s): %r", member, reason, e)
 
         # 2) Laufende Raid-Events als DM (immer versuchen, unabhängig davon ob 1) geklappt hat)
         try:
             await auto_resend_for_new_member(member)
-            print(f"[join_hook] Auto-Resend für {member} ausgeführt.")
+            log.info("Auto-Resend für %s ausgeführt.", member)
         except Exception as e:
-            print(f"[join_hook] Auto-Resend an {member} fehlgeschlagen: {e!r}")
+            log.warning("Auto-Resend an %s fehlgeschlagen: %r", member, e)
 
     except Exception as e:
-        print(f"[join_hook] _try_send_onboarding Fehler: {e!r}")
+        log.warning("_try_send_onboarding Fehler: %r", e)
 
 def _chain_listener(client: discord.Client, name: str, ours):
     """
@@ -89,10 +146,10 @@ def _chain_listener(client: discord.Client, name: str, ours):
     if hasattr(client, "add_listener"):
         try:
             client.add_listener(ours, name)  # type: ignore[attr-defined]
-            print(f"[join_hook] add_listener -> {name}")
+            log.info("add_listener -> %s", name)
             return
         except Exception as e:
-            print(f"[join_hook] add_listener failed for {name}: {e!r}")
+            log.warning("add_listener failed for %s: %r", name, e)
 
     # Fallback: Kaskade
     existing = getattr(client, name, None)
@@ -101,20 +158,20 @@ def _chain_listener(client: discord.Client, name: str, ours):
             try:
                 await existing(*args, **kwargs)
             except Exception as e:
-                print(f"[join_hook] existing {name} error: {e!r}")
+                log.warning("existing %s error: %r", name, e)
             try:
                 await ours(*args, **kwargs)
             except Exception as e:
-                print(f"[join_hook] ours {name} error: {e!r}")
+                log.warning("ours %s error: %r", name, e)
         setattr(client, name, chained)
-        print(f"[join_hook] chained -> {name}")
+        log.info("chained -> %s", name)
     else:
         setattr(client, name, ours)
-        print(f"[join_hook] set -> {name}")
+        log.info("set -> %s", name)
 
 def register_join_hook(
     client: discord.Client,
-    send_onboarding_dm: Callable[[discord.Member], Awaitable[None]],
+    send_onboarding_dm: Callable[[discord.Member], Awaitable[object]],
     auto_resend_for_new_member: Callable[[discord.Member], Awaitable[None]],
 ) -> None:
     """
@@ -124,15 +181,17 @@ def register_join_hook(
       - on_member_remove: Merker löschen (damit Rejoin wieder Onboarding erhält)
     """
 
+    setup_queued_logger(log)
+
     # Sanity-Checks (helfen beim Diagnostizieren)
     intents = getattr(client, "intents", None)
     if not intents or not intents.members:
-        print("⚠️ [join_hook] WARN: Intents.members ist AUS! Aktiviere im Code UND im Dev-Portal 'Server Members Intent'.")
+        log.warning("⚠️ WARN: Intents.members ist AUS! Aktiviere im Code UND im Dev-Portal 'Server Members Intent'.")
     else:
-        print("✅ [join_hook] Intents.members aktiv.")
+        log.info("✅ Intents.members aktiv.")
 
     async def _on_member_join(member: discord.Member):
-        print(f"[join_hook] on_member_join: {member} (pending={getattr(member,'pending', None)})")
+        log.info("on_member_join: %s (pending=%s)", member, getattr(member, "pending", None))
         await _try_send_onboarding(member, send_onboarding_dm, auto_resend_for_new_member, reason="join")
 
     async def _on_member_update(before: discord.Member, after: discord.Member):
@@ -142,17 +201,17 @@ def register_join_hook(
             if before.guild.id != after.guild.id:
                 return
             if getattr(before, "pending", False) and not getattr(after, "pending", False):
-                print(f"[join_hook] on_member_update: {after} pending True->False")
+                log.info("on_member_update: %s pending True->False", after)
                 await _try_send_onboarding(after, send_onboarding_dm, auto_resend_for_new_member, reason="pending->False")
         except Exception as e:
-            print(f"[join_hook] on_member_update Fehler: {e!r}")
+            log.warning("on_member_update Fehler: %r", e)
 
     async def _on_member_remove(member: discord.Member):
         try:
-            _clear_sent(member.guild.id, member.id)
-            print(f"[join_hook] Merker für {member} entfernt (Leave/Rejoin).")
+            await _clear_sent(member.guild.id, member.id)
+            log.info("Merker für %s entfernt (Leave/Rejoin).", member)
         except Exception as e:
-            print(f"[join_hook] on_member_remove Fehler: {e!r}")
+            log.warning("on_member_remove Fehler: %r", e)
 
     _chain_listener(client, "on_member_join", _on_member_join)
     _chain_listener(client, "on_member_update", _on_member_update)
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import mmap
 import os
+import re
 import tempfile
 from pathlib import Path
 from threading import RLock
 from typing import Any
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # optional: ohne orjson bleibt die stdlib der Fallback
+    orjson = None
+
 _LOCKS: dict[str, RLock] = {}
+_SHARED: dict[str, tuple[int, Any]] = {}
+_DIGESTS: dict[str, bytes] = {}
+# Ab dieser Größe parst orjson direkt aus einer gemappten Datei statt einer Kopie.
+_MMAP_MIN_BYTES = 1 << 20
 
 
 def _lock_for(path: Path) -> RLock:
@@ -27,6 +39,46 @@ def warn_json_store(context: str, message: str, exc: BaseException | None = None
         print(f"{prefix} {message}: {type(exc).__name__}: {exc}", flush=True)
 
 
+def dumps_json(obj: Any, *, compact: bool = False) -> bytes:
+    """Serialisiert nach UTF-8-JSON; mit orjson, falls installiert."""
+    if orjson is not None:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (0 if compact else orjson.OPT_INDENT_2)
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            pass  # z. B. Ganzzahlen > 64 Bit: die stdlib kann das
+    if compact:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+# orjson liest Ganzzahlen außerhalb von i64/u64 still als float. Zahlenfolgen,
+# die so groß sein könnten, gehen deshalb an die stdlib; Treffer in Strings
+# kosten nur Zeit, nicht Korrektheit. Discord-IDs (bis 19 Stellen) bleiben bei orjson.
+_WIDE_INT = re.compile(rb"-\d{19}|\d{20}")
+
+
+def loads_json(raw: bytes | memoryview) -> Any:
+    if orjson is not None and _WIDE_INT.search(raw) is None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            pass  # z. B. NaN aus alten stdlib-Dateien
+    return json.loads(raw.tobytes() if isinstance(raw, memoryview) else raw)
+
+
+def _load_payload(path: Path) -> Any:
+    with path.open("rb") as fh:
+        if orjson is None or os.fstat(fh.fileno()).st_size < _MMAP_MIN_BYTES:
+            return loads_json(fh.read())
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)
+            try:
+                return loads_json(view)
+            finally:
+                view.release()
+
+
 def load_json_file(path: Path, default: Any, *, context: str = "", check_type: bool = True) -> Any:
     """Liest JSON robust und meldet kaputte Dateien sichtbar im Railway-Log.
 
@@ -37,7 +89,7 @@ def load_json_file(path: Path, default: Any, *, context: str = "", check_type: b
     try:
         if not path.exists():
             return default
-        data = json.loads(path.read_text(encoding="utf-8"))
+        data = _load_payload(path)
         if check_type and default is not None and not isinstance(data, type(default)):
             warn_json_store(context or path.name, f"Typ passt nicht bei {path.name}; nutze Default")
             return default
@@ -47,29 +99,60 @@ def load_json_file(path: Path, default: Any, *, context: str = "", check_type: b
         return default
 
 
-def save_json_atomic(path: Path, obj: Any, *, context: str = "") -> None:
+def load_json_shared(path: Path, default: Any, *, context: str = "") -> Any:
+    """Wie load_json_file, aber pro Pfad und mtime nur einmal geparst.
+
+    Module, die dieselbe Datei laden, erhalten dasselbe Objekt, solange die
+    Datei auf der Platte unverändert ist.
+    """
+    path = Path(path)
+    key = str(path.resolve())
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return default
+    cached = _SHARED.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    data = load_json_file(path, default, context=context)
+    if data is not default:
+        _SHARED[key] = (mtime, data)
+    return data
+
+
+def save_json_atomic(path: Path, obj: Any, *, context: str = "", skip_unchanged: bool = False, compact: bool = False) -> None:
     """Schreibt JSON atomar: erst Temp-Datei, dann os.replace.
 
     Dadurch bleibt die alte Datei erhalten, falls Railway/Bot genau beim Schreiben
-    stoppt oder ein Fehler passiert.
+    stoppt oder ein Fehler passiert. Mit skip_unchanged entfällt der Schreibvorgang,
+    wenn der Inhalt identisch zum zuletzt geschriebenen Stand ist; compact lässt
+    die Einrückung weg.
     """
     path = Path(path)
     path.parent.mkdir(parents=True, exist_ok=True)
-    payload = json.dumps(obj, indent=2, ensure_ascii=False)
+    payload = dumps_json(obj, compact=compact)
+    key = str(path.resolve())
+    digest = hashlib.blake2b(payload, digest_size=16).digest() if skip_unchanged else b""
     lock = _lock_for(path)
     tmp_name = ""
     with lock:
+        if skip_unchanged and _DIGESTS.get(key) == digest and path.exists():
+            return
         try:
-            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp", delete=False) as tmp:
+            with tempfile.NamedTemporaryFile("wb", dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp", delete=False) as tmp:
                 tmp_name = tmp.name
                 tmp.write(payload)
-                tmp.write("\n")
+                tmp.write(b"\n")
                 tmp.flush()
                 try:
                     os.fsync(tmp.fileno())
                 except OSError:
                     pass
             os.replace(tmp_name, path)
+            if skip_unchanged:
+                _DIGESTS[key] = digest
+            if key in _SHARED:
+                _SHARED[key] = (path.stat().st_mtime_ns, obj)
         except Exception as exc:
             if tmp_name:
                 try:
@@ -78,3 +161,39 @@ def save_json_atomic(path: Path, obj: Any, *, context: str = "") -> None:
                     pass
             warn_json_store(context or path.name, f"JSON konnte nicht gespeichert werden ({path})", exc)
             raise
+
+
+def append_json_lines(path: Path, objs: list[Any], *, context: str = "") -> int:
+    """Hängt jedes Objekt als kompakte JSON-Zeile an (ein Schreibvorgang) und gibt die neue Dateigröße zurück."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = b"".join(dumps_json(obj, compact=True) + b"\n" for obj in objs)
+    with _lock_for(path):
+        try:
+            with path.open("ab") as fh:
+                fh.write(payload)
+                return fh.tell()
+        except Exception as exc:
+            warn_json_store(context or path.name, f"JSON-Zeilen konnten nicht angehängt werden ({path})", exc)
+            raise
+
+
+def read_json_lines(path: Path, *, context: str = "") -> list[Any]:
+    """Liest eine JSON-Lines-Datei; eine nach Absturz angerissene Zeile wird übersprungen."""
+    path = Path(path)
+    try:
+        raw = path.read_bytes()
+    except FileNotFoundError:
+        return []
+    except Exception as exc:
+        warn_json_store(context or path.name, f"JSON-Zeilen konnten nicht gelesen werden ({path})", exc)
+        return []
+    out: list[Any] = []
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        try:
+            out.append(loads_json(line))
+        except ValueError:
+            warn_json_store(context or path.name, f"Defekte Zeile in {path.name} übersprungen")
+    return out
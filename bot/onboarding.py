@@ -1,12 +1,23 @@
 from __future__ import annotations
-import json
+import asyncio
+import atexit
+import copy
+import functools
+import logging
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 
 try:
-    from bot.json_store import load_json_file, save_json_atomic, warn_json_store  # type: ignore
+    from bot.json_store import append_json_lines, load_json_shared, read_json_lines, save_json_atomic  # type: ignore
 except Exception:
-    from json_store import load_json_file, save_json_atomic, warn_json_store  # type: ignore
+    from json_store import append_json_lines, load_json_shared, read_json_lines, save_json_atomic  # type: ignore
+
+try:
+    from bot.queued_log import setup_queued_logger  # type: ignore
+except Exception:
+    from queued_log import setup_queued_logger  # type: ignore
 
 import discord
 from discord import app_commands
@@ -18,10 +29,15 @@ try:
 except Exception:
     from channel_picker import send_text_channel_picker, send_voice_channel_picker  # type: ignore
 
+log = logging.getLogger("onboarding")
+
 DATA_DIR = Path(__file__).resolve().parent / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
 CFG_FILE = DATA_DIR / "onboarding_cfg.json"
 SESSIONS_FILE = DATA_DIR / "onboarding_sessions.json"
+# Änderungen an den Sitzungen werden als Zeilen angehängt und erst ab
+# _SESSIONS_LOG_MAX Bytes (oder beim Beenden) in SESSIONS_FILE verdichtet.
+SESSIONS_LOG = DATA_DIR / "onboarding_sessions.log"
+_SESSIONS_LOG_MAX = 256 * 1024
 
 # cfg[guild_id] = {
 #   "enabled": bool,
@@ -29,77 +45,252 @@ SESSIONS_FILE = DATA_DIR / "onboarding_sessions.json"
 #   "require_review": bool,
 #   "category_roles": {"guild": int, "ally": int, "friend": int, "applicant": int},
 #   "primary_roles":  {"TANK": int, "HEAL": int, "DPS": int},
-#   "experience_roles": {"experienced": int, "newbie": int}
+#   "experience_roles": {"experienced": int, "newbie": int},
+#   "allow_member_fetch": bool   # optional: REST-Nachladen trotz Members-Intent
 # }
 
-def _load_cfg() -> dict:
-    return load_json_file(CFG_FILE, {}, context=__name__)
-
-def _save_cfg(obj: dict) -> None:
-    save_json_atomic(CFG_FILE, obj, context=__name__)
+def _int_or_zero(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def _normalize_cfg(raw: dict) -> dict[int, dict]:
+    # Guild-, Rollen- und Kanal-IDs einmal beim Laden auf int bringen, damit die
+    # Hot-Paths nicht bei jedem Klick int(... or 0) bzw. str(guild.id) rechnen müssen.
+    out: dict[int, dict] = {}
+    for gid, c in raw.items():
+        gid = _int_or_zero(gid)
+        if not gid or not isinstance(c, dict):
+            continue
+        out[gid] = c
+        if "review_channel" in c:
+            c["review_channel"] = _int_or_zero(c.get("review_channel"))
+        for key in ("enabled", "require_review"):
+            if key in c:
+                c[key] = bool(c[key])
+        for key in ("category_roles", "primary_roles", "experience_roles"):
+            roles = c.get(key)
+            if isinstance(roles, dict):
+                c[key] = {k: _int_or_zero(v) for k, v in roles.items()}
+    return out
+
+def _load_cfg() -> dict[int, dict]:
+    return _normalize_cfg(load_json_shared(CFG_FILE, {}, context=__name__))
+
+def _save_cfg(obj: dict[int, dict]) -> None:
+    # Auf der Platte bleiben es String-Schlüssel (weekly_report liest die Datei mit).
+    save_json_atomic(CFG_FILE, {str(gid): c for gid, c in obj.items()}, context=__name__, skip_unchanged=True, compact=True)
+
+# Erst beim ersten Zugriff laden, nicht schon beim Import.
+cfg: dict[int, dict] | None = None  # guild_id (int) -> Guild-Konfiguration
+
+def _ensure_cfg() -> dict[int, dict]:
+    global cfg
+    if cfg is None:
+        cfg = _load_cfg()
+    return cfg
+
+# Admin-Befehle ändern cfg nur im Speicher; geschrieben wird gebündelt im
+# Hintergrund, damit der Event-Loop nicht auf die Platte wartet.
+_CFG_FLUSH_DELAY = 1.5
+_cfg_dirty = False
+_cfg_flush_task: Optional[asyncio.Task] = None
+
+async def _cfg_flush_debounced() -> None:
+    global _cfg_flush_task, _cfg_dirty
+    try:
+        await asyncio.sleep(_CFG_FLUSH_DELAY)
+        while _cfg_dirty:
+            _cfg_dirty = False
+            snapshot = copy.deepcopy(_ensure_cfg())
+            await asyncio.to_thread(_save_cfg, snapshot)
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        _cfg_dirty = True  # beim nächsten Speichern bzw. beim Beenden erneut versuchen
+        log.warning("Konfiguration konnte nicht gespeichert werden: %r", exc)
+    finally:
+        _cfg_flush_task = None
+
+def _schedule_cfg_save() -> None:
+    global _cfg_flush_task, _cfg_dirty
+    _cfg_dirty = True
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        _flush_cfg_now()
+        return
+    if _cfg_flush_task is None or _cfg_flush_task.done():
+        _cfg_flush_task = loop.create_task(_cfg_flush_debounced())
+
+@atexit.register
+def _flush_cfg_now() -> None:
+    global _cfg_dirty
+    if _cfg_dirty and cfg is not None:
+        _cfg_dirty = False
+        _save_cfg(cfg)
 
-cfg: dict = _load_cfg()
+_ADMIN_MASK = discord.Permissions.administrator.flag | discord.Permissions.manage_guild.flag
 
+# Bewusst ohne Cache: entzogene Admin-Rollen müssen sofort wirken, auch bei
+# Review-Entscheidungen. guild_permissions ist nur eine Schleife über die Rollen.
 def _is_admin(inter: discord.Interaction) -> bool:
-    p = getattr(inter.user, "guild_permissions", None)
-    return bool(p and (p.administrator or p.manage_guild))
+    if not isinstance(inter.user, discord.Member):
+        return False
+    return (inter.user.guild_permissions.value & _ADMIN_MASK) != 0
+
+def _admin_only(fn):
+    """Slash-Handler nur für Admins ausführen; sonst ephemeral ablehnen."""
+    @functools.wraps(fn)
+    async def wrapper(inter: discord.Interaction, *args, **kwargs):
+        if not _is_admin(inter):
+            await inter.response.send_message("Nur Admins.", ephemeral=True)
+            return
+        return await fn(inter, *args, **kwargs)
+    return wrapper
+
+# guild.id -> derselbe dict wie cfg[guild.id]; Admin-Befehle ändern ihn in place.
+_gcfg_cache: dict[int, dict] = {}
 
 def _gcfg(guild: discord.Guild) -> dict:
-    c = cfg.get(str(guild.id)) or {}
+    c = _gcfg_cache.get(guild.id)
+    if c is not None:
+        return c
+    c = _ensure_cfg().get(guild.id) or {}
     c.setdefault("enabled", True)
     c.setdefault("review_channel", 0)
     c.setdefault("require_review", False)
     c.setdefault("category_roles", {})
     c.setdefault("primary_roles", {})
     c.setdefault("experience_roles", {})
-    cfg[str(guild.id)] = c
+    cfg[guild.id] = c
+    _gcfg_cache[guild.id] = c
     return c
 
-def _role(guild: discord.Guild, rid: int | None) -> Optional[discord.Role]:
-    return guild.get_role(int(rid or 0)) if rid else None
+async def _resolve_member(client: discord.Client, guild: discord.Guild, member_id: int) -> Optional[discord.Member]:
+    # Mit aktivem Members-Intent (siehe join_hook) hält discord.py alle Mitglieder
+    # im Cache; fehlt jemand dort, hat er den Server verlassen und der REST-Call
+    # lieferte nur 404. Ohne Intent oder mit "allow_member_fetch" wird nachgeladen.
+    m = guild.get_member(member_id)
+    if m is not None:
+        return m
+    if client.intents.members and not _gcfg(guild).get("allow_member_fetch", False):
+        log.info("Mitglied %s nicht im Cache von %s", member_id, guild.id)
+        return None
+    try:
+        return await guild.fetch_member(member_id)
+    except discord.HTTPException:  # NotFound/Forbidden sind Unterklassen
+        return None
+
+class RoleBasket(NamedTuple):
+    category: dict[str, discord.Role]
+    primary: dict[str, discord.Role]
+    experience: dict[bool, discord.Role]
+    # (Kategorie, Primärrolle, erfahren) -> zu vergebende Rollen; füllt sich beim ersten Bedarf.
+    plan: dict[tuple[str, str, bool], tuple[discord.Role, ...]]
+
+# guild.id -> aufgelöste Onboarding-Rollen; wird von den Rollen-Settern und
+# beim Löschen einer Rolle verworfen.
+_role_cache: dict[int, RoleBasket] = {}
+
+def _build_basket(guild: discord.Guild) -> RoleBasket:
+    c = _gcfg(guild)
+    # Einmal binden statt pro ID über _role/guild.get_role zu dispatchen;
+    # guild._roles bleibt bewusst privat.
+    get_role = guild.get_role
+
+    def _resolve(ids: dict) -> dict:
+        return {key: r for key, rid in ids.items() if rid and (r := get_role(rid))}
+
+    exp = _resolve(c.get("experience_roles") or {})
+    return RoleBasket(
+        category=_resolve(c.get("category_roles") or {}),
+        primary=_resolve(c.get("primary_roles") or {}),
+        experience={flag: exp[key] for flag, key in ((True, "experienced"), (False, "newbie")) if key in exp},
+        plan={},
+    )
+
+def _role_basket(guild: discord.Guild) -> RoleBasket:
+    basket = _role_cache.get(guild.id)
+    if basket is None:
+        basket = _role_cache[guild.id] = _build_basket(guild)
+    return basket
+
+def _update_cfg(guild: discord.Guild, **changes) -> None:
+    """Admin-Änderung übernehmen, abhängige Caches verwerfen und Speichern einplanen."""
+    _gcfg(guild).update(changes)
+    if any(key.endswith("_roles") for key in changes):
+        _role_cache.pop(guild.id, None)
+        _unconfigured_warned.discard(guild.id)
+    _schedule_cfg_save()
+
+def _role_plan(basket: RoleBasket, category_key: str, primary_key: str, experienced: bool) -> tuple[discord.Role, ...]:
+    key = (category_key, primary_key, bool(experienced))
+    plan = basket.plan.get(key)
+    if plan is None:
+        plan = basket.plan[key] = tuple(
+            r for r in (
+                basket.category.get(category_key),
+                basket.primary.get(primary_key),
+                basket.experience.get(key[2]),
+            ) if r
+        )
+    return plan
 
 async def _assign_roles(member: discord.Member, category_key: str, primary_key: str, experienced: bool) -> List[discord.Role]:
-    out: List[discord.Role] = []
-    g = member.guild
-    c = _gcfg(g)
-
-    cat_map = (c.get("category_roles") or {})
-    cat_rid = {
-        "guild": cat_map.get("guild"),
-        "ally": cat_map.get("ally"),
-        "friend": cat_map.get("friend"),
-        "applicant": cat_map.get("applicant"),
-    }.get(category_key)
-
-    r = _role(g, cat_rid)
-    out += [r] if r else []
-
-    prim_map = (c.get("primary_roles") or {})
-    r = _role(g, prim_map.get(primary_key.upper()))
-    out += [r] if r else []
-
-    exp_map = (c.get("experience_roles") or {})
-    r = _role(g, exp_map.get("experienced" if experienced else "newbie"))
-    out += [r] if r else []
-
-    granted = []
-    for role in out:
+    guild = member.guild
+    # member.roles baut bei jedem Zugriff eine neue sortierte Liste: einmal als Set holen.
+    current = set(member.roles)
+    for attempt in range(2):
+        out: List[discord.Role] = list(_role_plan(_role_basket(guild), category_key, primary_key, experienced))
+        if not out:
+            return out
+        to_add = [r for r in out if r not in current]
+        if attempt:
+            # Beim zweiten Versuch nur Rollen unterhalb der Bot-Rolle mitschicken.
+            to_add = [r for r in to_add if r.is_assignable()]
+            out = [r for r in out if r in current or r in to_add]
+        if not to_add:
+            return out
+        # atomic=False: discord.py setzt alle Rollen mit einem einzigen
+        # Modify-Guild-Member-PATCH statt einem PUT pro Rolle.
         try:
-            if role and role not in member.roles:
-                await member.add_roles(role, reason="Onboarding")
-            if role:
-                granted.append(role)
-        except Exception:
-            pass
-
-    return granted
+            await member.add_roles(*to_add, reason="Onboarding", atomic=False)
+            return out
+        except discord.HTTPException as exc:  # Forbidden ist eine Unterklasse
+            # Eine ungültige Rolle (gelöscht, während der Bot offline war, oder über
+            # der Bot-Rolle) lässt den ganzen PATCH scheitern: Korb neu auflösen und
+            # einmal erneut versuchen.
+            _role_cache.pop(guild.id, None)
+            log.warning("Rollenvergabe an %s in %s fehlgeschlagen (Versuch %d): %r", member.id, guild.id, attempt + 1, exc)
+    return [r for r in out if r in current]
+
+# Entspricht isinstance(ch, (TextChannel, Thread)), prüft aber nur ch.type.
+_REVIEW_CHANNEL_TYPES = frozenset({
+    discord.ChannelType.text,
+    discord.ChannelType.news,
+    discord.ChannelType.news_thread,
+    discord.ChannelType.public_thread,
+    discord.ChannelType.private_thread,
+})
 
 def _review_channel(guild: discord.Guild) -> Optional[discord.abc.Messageable]:
-    ch_id = int((_gcfg(guild).get("review_channel") or 0))
-    ch = guild.get_channel(ch_id)
-    return ch if isinstance(ch, (discord.TextChannel, discord.Thread)) else None
+    ch = guild.get_channel(_gcfg(guild)["review_channel"])
+    return ch if getattr(ch, "type", None) in _REVIEW_CHANNEL_TYPES else None
 
 class StepContext:
+    __slots__ = (
+        "member_id",
+        "guild_id",
+        "message_id",
+        "stage",
+        "category",
+        "primary",
+        "experienced",
+        "created_at",
+    )
+
     def __init__(
         self,
         member_id: int,
@@ -110,6 +301,7 @@ class StepContext:
         category: str | None = None,
         primary: str | None = None,
         experienced: bool | None = None,
+        created_at: float | None = None,
     ):
         self.member_id = int(member_id)
         self.guild_id = int(guild_id)
@@ -118,6 +310,8 @@ class StepContext:
         self.category = category
         self.primary = primary
         self.experienced = experienced
+        # Wanduhrzeit, damit das Alter auch über Neustarts hinweg stimmt.
+        self.created_at = float(created_at or time.time())
 
     def to_dict(self) -> dict:
         return {
@@ -128,6 +322,7 @@ class StepContext:
             "category": self.category,
             "primary": self.primary,
             "experienced": self.experienced,
+            "created_at": self.created_at,
         }
 
     @classmethod
@@ -140,72 +335,263 @@ class StepContext:
             category=raw.get("category"),
             primary=raw.get("primary"),
             experienced=raw.get("experienced"),
+            created_at=raw.get("created_at"),
         )
 
 
-def _load_sessions() -> dict[str, dict]:
-    raw = load_json_file(SESSIONS_FILE, {}, context=__name__)
-    return raw if isinstance(raw, dict) else {}
+# Im Speicher ist message_id ein int; nur die JSON-Datei braucht String-Schlüssel.
+# Datensätze werden beim Laden über StepContext normalisiert, danach sind alle
+# IDs ints und die Hot-Paths lesen sie ohne int(... or 0).
+def _load_sessions() -> dict[int, dict]:
+    raw = load_json_shared(SESSIONS_FILE, {}, context=__name__)
+    if not isinstance(raw, dict):
+        return {}
+    out: dict[int, dict] = {}
+    for key, value in raw.items():
+        mid = _int_or_zero(key)
+        if mid and isinstance(value, dict):
+            try:
+                out[mid] = StepContext.from_dict(value).to_dict()
+            except (TypeError, ValueError):
+                continue
+    return out
+
+
+def _encode_sessions(records: dict[int, dict]) -> dict[str, dict]:
+    return {str(mid): value for mid, value in records.items()}
+
+
+_session_records: dict[int, dict] | None = None
+# member_id -> (zuletzt gesehen, ctx). Nur ein Index im Speicher: die DM-Views
+# sind zustandslos und _session_records bleibt die persistente Quelle, aus der
+# _ctx_for einen verdrängten Eintrag wiederherstellt. Deshalb darf der Index
+# begrenzt sein und untätige Einträge verlieren.
+_SESSIONS_MAX = 10_000
+_SESSION_IDLE_SECONDS = 600
+_sessions: OrderedDict[int, tuple[float, StepContext]] = OrderedDict()
+_session_sweeper_task: Optional[asyncio.Task] = None
+
+
+def _track_session(ctx: StepContext) -> None:
+    _sessions[ctx.member_id] = (time.monotonic(), ctx)
+    _sessions.move_to_end(ctx.member_id)
+    while len(_sessions) > _SESSIONS_MAX:
+        _sessions.popitem(last=False)
+
+
+def _evict_idle_sessions() -> None:
+    cutoff = time.monotonic() - _SESSION_IDLE_SECONDS
+    while _sessions:
+        seen, _ctx = next(iter(_sessions.values()))
+        if seen > cutoff:
+            break
+        _sessions.popitem(last=False)
+
+
+# Abgebrochene DM-Abläufe würden sonst für immer in _session_records bleiben.
+# Offene Reviews bleiben stehen, bis die Gildenleitung entschieden hat.
+_SESSION_RECORD_TTL = 7 * 24 * 3600
+
+
+def _prune_stale_records() -> None:
+    if _session_records is None:
+        return
+    cutoff = time.time() - _SESSION_RECORD_TTL
+    for mid, raw in list(_session_records.items()):
+        if raw["stage"] != "review" and raw["created_at"] < cutoff:
+            _forget_message(mid)
+
+
+async def _session_sweeper() -> None:
+    while True:
+        await asyncio.sleep(60)
+        _evict_idle_sessions()
+        _prune_stale_records()
+
+
+def _replay_session_log(records: dict[int, dict]) -> None:
+    for entry in read_json_lines(SESSIONS_LOG, context=__name__):
+        if not isinstance(entry, dict):
+            continue
+        key = _int_or_zero(entry.get("k"))
+        if not key:
+            continue
+        if entry.get("op") == "set" and isinstance(entry.get("v"), dict):
+            try:
+                records[key] = StepContext.from_dict(entry["v"]).to_dict()
+            except (TypeError, ValueError):
+                continue
+        elif entry.get("op") == "del":
+            records.pop(key, None)
+
+
+def _ensure_sessions() -> dict[int, dict]:
+    global _session_records
+    if _session_records is None:
+        _session_records = _load_sessions()
+        _replay_session_log(_session_records)
+        for raw_ctx in list(_session_records.values()):
+            try:
+                ctx = StepContext.from_dict(raw_ctx)
+                if ctx.member_id and ctx.guild_id and ctx.message_id:
+                    _track_session(ctx)
+            except (TypeError, ValueError):
+                continue
+    return _session_records
+
+
+def _compact_sessions(records: dict[int, dict] | None = None) -> None:
+    records = _ensure_sessions() if records is None else records
+    save_json_atomic(SESSIONS_FILE, _encode_sessions(records), context=__name__, skip_unchanged=True)
+    SESSIONS_LOG.unlink(missing_ok=True)
+
 
+# Klicks ändern _session_records sofort, die Journalzeilen werden aber gesammelt
+# und höchstens alle _SESSIONS_FLUSH_DELAY Sekunden in einem Rutsch geschrieben.
+_SESSIONS_FLUSH_DELAY = 0.5
+_session_log_buf: list[dict] = []
+_session_flush_task: Optional[asyncio.Task] = None
 
-def _save_sessions() -> None:
-    save_json_atomic(SESSIONS_FILE, _session_records, context=__name__)
+
+def _append_session_log(entries: list[dict]) -> None:
+    if append_json_lines(SESSIONS_LOG, entries, context=__name__) > _SESSIONS_LOG_MAX:
+        _compact_sessions()
+
+
+async def _session_flush_debounced() -> None:
+    global _session_flush_task
+    try:
+        while _session_log_buf:
+            await asyncio.sleep(_SESSIONS_FLUSH_DELAY)
+            entries = list(_session_log_buf)
+            _session_log_buf.clear()
+            try:
+                size = await asyncio.to_thread(append_json_lines, SESSIONS_LOG, entries, context=__name__)
+            except Exception:
+                _session_log_buf[:0] = entries  # beim nächsten Klick bzw. beim Beenden erneut
+                return
+            if size > _SESSIONS_LOG_MAX:
+                await asyncio.to_thread(_compact_sessions, dict(_ensure_sessions()))
+    except asyncio.CancelledError:
+        raise
+    except Exception as exc:
+        log.warning("Sitzungen konnten nicht gespeichert werden: %r", exc)
+    finally:
+        _session_flush_task = None
+
+
+def _queue_session_log(entry: dict) -> None:
+    global _session_flush_task
+    _session_log_buf.append(entry)
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        entries = list(_session_log_buf)
+        _session_log_buf.clear()
+        _append_session_log(entries)
+        return
+    if _session_flush_task is None or _session_flush_task.done():
+        _session_flush_task = loop.create_task(_session_flush_debounced())
+
+
+@atexit.register
+def _compact_sessions_at_exit() -> None:
+    # _session_records ist aktuell; der Snapshot deckt auch noch gepufferte Zeilen ab.
+    if _session_records is not None and (_session_log_buf or SESSIONS_LOG.exists()):
+        _session_log_buf.clear()
+        _compact_sessions()
+
+
+def _set_session(key: int, raw: dict) -> None:
+    _ensure_sessions()[key] = raw
+    _queue_session_log({"op": "set", "k": key, "v": raw})
+
+
+def _del_session(key: int) -> None:
+    _queue_session_log({"op": "del", "k": key})
 
 
 def _remember_ctx(ctx: StepContext) -> None:
     if ctx.message_id <= 0:
         return
-    _sessions[ctx.member_id] = ctx
-    _session_records[str(ctx.message_id)] = ctx.to_dict()
-    _save_sessions()
+    _set_session(ctx.message_id, ctx.to_dict())
+    _track_session(ctx)
 
 
 def _forget_message(message_id: int) -> None:
-    raw = _session_records.pop(str(int(message_id or 0)), None)
+    key = int(message_id or 0)
+    raw = _ensure_sessions().pop(key, None)
     if isinstance(raw, dict):
-        member_id = int(raw.get("member_id", 0) or 0)
+        member_id = raw["member_id"]
         current = _sessions.get(member_id)
-        if current and current.message_id == int(message_id or 0):
+        if current and current[1].message_id == key:
             _sessions.pop(member_id, None)
-    _save_sessions()
+        _del_session(key)
 
 
 def _forget_member_sessions(member_id: int) -> None:
+    # Offene Reviews bleiben stehen: ReviewView liest seine Daten nur aus diesem
+    # Datensatz, ein erneuter Join oder /onboarding send darf ihn nicht verwaisen.
     member_id = int(member_id)
-    changed = False
-    for message_id, raw in list(_session_records.items()):
-        if isinstance(raw, dict) and int(raw.get("member_id", 0) or 0) == member_id:
-            _session_records.pop(message_id, None)
-            changed = True
+    records = _ensure_sessions()
+    for message_id, raw in list(records.items()):
+        if raw["member_id"] == member_id and raw["stage"] != "review":
+            records.pop(message_id, None)
+            _del_session(message_id)
     _sessions.pop(member_id, None)
-    if changed:
-        _save_sessions()
 
 
-_session_records: dict[str, dict] = _load_sessions()
-_sessions: dict[int, StepContext] = {}
-for _raw_ctx in list(_session_records.values()):
-    try:
-        _ctx = StepContext.from_dict(_raw_ctx)
-        if _ctx.member_id and _ctx.guild_id and _ctx.message_id:
-            _sessions[_ctx.member_id] = _ctx
-    except Exception:
-        continue
+def _ctx_for(inter: discord.Interaction) -> Optional[StepContext]:
+    """Sitzung zur geklickten DM: erst der Index, sonst der gespeicherte Datensatz."""
+    message_id = int(inter.message.id) if inter.message else 0
+    current = _sessions.get(inter.user.id)
+    if current is not None and current[1].message_id == message_id:
+        return current[1]
+    raw = _ensure_sessions().get(message_id)
+    if not isinstance(raw, dict):
+        return None
+    ctx = StepContext.from_dict(raw)
+    if ctx.member_id != inter.user.id:
+        return None
+    _track_session(ctx)
+    return ctx
+
+
+async def _session_gone(inter: discord.Interaction) -> None:
+    await inter.response.send_message(
+        "⚠️ Diese Onboarding-Sitzung ist abgelaufen. Bitte wende dich an die Gildenleitung.",
+        ephemeral=True,
+    )
+
+
+# Die DM-Views und die Review-View sind zustandslos: je Stufe gibt es eine
+# Instanz, die einmal per client.add_view registriert wird; den ctx liefern
+# _ctx_for bzw. ReviewView._review_record pro Klick.
+_flow_views: dict[str, View] = {}
+
+
+def _flow_view(stage: str) -> View:
+    view = _flow_views.get(stage)
+    if view is None:
+        view = _flow_views[stage] = _FLOW_VIEW_TYPES[stage]()
+    return view
+
 
 class CategoryView(View):
-    def __init__(self, ctx: StepContext):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.ctx = ctx
 
     async def _next(self, inter: discord.Interaction, cat: str):
-        self.ctx.category = cat
-        self.ctx.stage = "primary"
-        if inter.message:
-            self.ctx.message_id = int(inter.message.id)
-        _remember_ctx(self.ctx)
+        ctx = _ctx_for(inter)
+        if ctx is None:
+            await _session_gone(inter)
+            return
+        ctx.category = cat
+        ctx.stage = "primary"
+        _remember_ctx(ctx)
         await inter.response.edit_message(
             content="Welche **Spielrolle** spielst du?",
-            view=PrimaryView(self.ctx)
+            view=_flow_view("primary")
         )
 
     @button(label="⚔️ Gildenmitglied", style=ButtonStyle.primary, custom_id="onboarding_category_guild")
@@ -225,19 +611,20 @@ class CategoryView(View):
         await self._next(inter, "applicant")
 
 class PrimaryView(View):
-    def __init__(self, ctx: StepContext):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.ctx = ctx
 
     async def _next(self, inter: discord.Interaction, primary: str):
-        self.ctx.primary = primary
-        self.ctx.stage = "experience"
-        if inter.message:
-            self.ctx.message_id = int(inter.message.id)
-        _remember_ctx(self.ctx)
+        ctx = _ctx_for(inter)
+        if ctx is None:
+            await _session_gone(inter)
+            return
+        ctx.primary = primary
+        ctx.stage = "experience"
+        _remember_ctx(ctx)
         await inter.response.edit_message(
             content="Bist du **erfahren** oder **unerfahren**?",
-            view=ExperienceView(self.ctx)
+            view=_flow_view("experience")
         )
 
     @button(label="🛡️ Tank", style=ButtonStyle.primary, custom_id="onboarding_primary_tank")
@@ -253,82 +640,100 @@ class PrimaryView(View):
         await self._next(inter, "DPS")
 
 class ReviewView(View):
-    def __init__(self, member_id: int, category: str, primary: str, experienced: bool, *, message_id: int = 0, guild_id: int = 0):
+    # Zustandslos wie die DM-Views: die Angaben stehen im Review-Datensatz der
+    # Nachricht in _session_records, nicht in der View.
+    def __init__(self):
         super().__init__(timeout=None)
-        self.member_id = int(member_id)
-        self.category = category
-        self.primary = primary
-        self.experienced = experienced
-        self.message_id = int(message_id or 0)
-        self.guild_id = int(guild_id or 0)
 
-    def _is_admin(self, inter: discord.Interaction) -> bool:
-        p = getattr(inter.user, "guild_permissions", None)
-        return bool(p and (p.administrator or p.manage_guild))
-
-    async def _get_member(self, guild: discord.Guild) -> Optional[discord.Member]:
-        m = guild.get_member(self.member_id)
-        if not m:
-            try:
-                m = await guild.fetch_member(self.member_id)
-            except Exception:
-                m = None
-        return m
+    @staticmethod
+    async def _review_record(inter: discord.Interaction) -> Optional[StepContext]:
+        raw = _ensure_sessions().get(int(inter.message.id) if inter.message else 0)
+        if raw is None or raw["stage"] != "review":
+            await inter.response.send_message("⚠️ Zu dieser Anfrage liegen keine Daten mehr vor.", ephemeral=True)
+            return None
+        return StepContext.from_dict(raw)
 
     @button(label="✅ Akzeptieren", style=ButtonStyle.success, custom_id="onboarding_review_accept")
     async def btn_accept(self, inter: discord.Interaction, _):
-        if not self._is_admin(inter):
+        if not _is_admin(inter):
             await inter.response.send_message("Nur Admins.", ephemeral=True)
             return
 
+        rec = await self._review_record(inter)
+        if rec is None:
+            return
+
+        # Erst nach defer(): _resolve_member kann einen REST-Call auslösen.
         await inter.response.defer()
-        member = await self._get_member(inter.guild)
+        member = await _resolve_member(inter.client, inter.guild, rec.member_id)
         if not member:
             await inter.followup.send("Mitglied nicht gefunden.", ephemeral=True)
             return
 
-        roles = await _assign_roles(member, self.category, self.primary, self.experienced)
+        # Rollenvergabe und Bestätigungs-DM sind unabhängig und laufen parallel.
+        roles, _ = await asyncio.gather(
+            _assign_roles(member, rec.category, rec.primary, bool(rec.experienced)),
+            member.send("✅ Deine Anfrage wurde **akzeptiert**. Willkommen!"),
+            return_exceptions=True,
+        )
+        if isinstance(roles, BaseException):
+            raise roles
         await inter.edit_original_response(
             content=f"✅ **Akzeptiert** – Rollen: {', '.join(r.mention for r in roles) if roles else '—'}",
             view=None
         )
-        _forget_message(self.message_id or (inter.message.id if inter.message else 0))
-
-        try:
-            await member.send("✅ Deine Anfrage wurde **akzeptiert**. Willkommen!")
-        except Exception:
-            pass
+        _forget_message(rec.message_id)
 
     @button(label="❌ Ablehnen", style=ButtonStyle.danger, custom_id="onboarding_review_deny")
     async def btn_deny(self, inter: discord.Interaction, _):
-        if not self._is_admin(inter):
+        if not _is_admin(inter):
             await inter.response.send_message("Nur Admins.", ephemeral=True)
             return
 
-        await inter.response.defer()
-        member = await self._get_member(inter.guild)
-        await inter.edit_original_response(content="❌ **Abgelehnt**.", view=None)
-        _forget_message(self.message_id or (inter.message.id if inter.message else 0))
+        rec = await self._review_record(inter)
+        if rec is None:
+            return
 
+        await inter.response.defer()
+        member = await _resolve_member(inter.client, inter.guild, rec.member_id)
+        pending = [inter.edit_original_response(content="❌ **Abgelehnt**.", view=None)]
         if member:
-            try:
-                await member.send("❌ Deine Anfrage wurde **abgelehnt**.")
-            except Exception:
-                pass
+            pending.append(member.send("❌ Deine Anfrage wurde **abgelehnt**."))
+        edited, *_ = await asyncio.gather(*pending, return_exceptions=True)
+        if isinstance(edited, BaseException):
+            raise edited
+        _forget_message(rec.message_id)
+
+_REVIEW_TMPL = (
+    "**Onboarding-Review:** {mention}\n"
+    "**Kategorie:** {cat}\n"
+    "**Rolle:** {pri}\n"
+    "**Erfahrung:** {exp}"
+)
+_CATEGORY_LABELS = {
+    "guild": "Gildenmitglied",
+    "ally": "Allianzmitglied",
+    "friend": "Freund",
+    "applicant": "Bewerber",
+}
+_PRIMARY_LABELS = {"TANK": "Tank", "HEAL": "Heal", "DPS": "DPS"}
+_WELCOME_TMPL = "👋 **Willkommen {name}!**\n\nWähle bitte zuerst deine **Kategorie**."
+_AUTO_LOG_TMPL = "📝 **Auto-Onboarding:** {mention} – {cat}, {pri}, {exp}\nRollen: {roles}"
 
 class ExperienceView(View):
-    def __init__(self, ctx: StepContext):
+    def __init__(self):
         super().__init__(timeout=None)
-        self.ctx = ctx
 
     async def _finish(self, inter: discord.Interaction, experienced: bool):
+        ctx = _ctx_for(inter)
+        if ctx is None:
+            await _session_gone(inter)
+            return
         try:
             if not inter.response.is_done():
                 await inter.response.defer()
-            self.ctx.experienced = experienced
-            if inter.message:
-                self.ctx.message_id = int(inter.message.id)
-            guild = inter.client.get_guild(self.ctx.guild_id)
+            ctx.experienced = experienced
+            guild = inter.client.get_guild(ctx.guild_id)
 
             if not guild:
                 await inter.edit_original_response(content="⚠️ Server nicht gefunden.", view=None)
@@ -338,25 +743,8 @@ class ExperienceView(View):
             review_ch = _review_channel(guild)
             require = bool(c.get("require_review"))
 
-            member = guild.get_member(self.ctx.member_id)
-            if not member:
-                try:
-                    member = await guild.fetch_member(self.ctx.member_id)
-                except Exception:
-                    member = None
-
-            cat_txt = {
-                "guild": "Gildenmitglied",
-                "ally": "Allianzmitglied",
-                "friend": "Freund",
-                "applicant": "Bewerber",
-            }.get(self.ctx.category, "—")
-
-            pri_txt = {
-                "TANK": "Tank",
-                "HEAL": "Heal",
-                "DPS": "DPS",
-            }.get(self.ctx.primary, "—")
+            cat_txt = _CATEGORY_LABELS.get(ctx.category, "—")
+            pri_txt = _PRIMARY_LABELS.get(ctx.primary, "—")
 
             exp_txt = "Erfahren" if experienced else "Unerfahren"
 
@@ -368,51 +756,50 @@ class ExperienceView(View):
                     )
                     return
 
-                desc = (
-                    f"**Onboarding-Review:** {member.mention if member else f'<@{self.ctx.member_id}>'}\n"
-                    f"**Kategorie:** {cat_txt}\n"
-                    f"**Rolle:** {pri_txt}\n"
-                    f"**Erfahrung:** {exp_txt}"
+                desc = _REVIEW_TMPL.format(
+                    mention=f"<@{ctx.member_id}>",
+                    cat=cat_txt,
+                    pri=pri_txt,
+                    exp=exp_txt,
                 )
 
-                review_view = ReviewView(
-                    self.ctx.member_id,
-                    self.ctx.category,
-                    self.ctx.primary,
-                    experienced,
-                    guild_id=self.ctx.guild_id,
-                )
-                review_message = await review_ch.send(desc, view=review_view)
-                review_view.message_id = int(review_message.id)
-                review_ctx = StepContext(
-                    self.ctx.member_id,
-                    self.ctx.guild_id,
-                    message_id=int(review_message.id),
-                    stage="review",
-                    category=self.ctx.category,
-                    primary=self.ctx.primary,
-                    experienced=experienced,
-                )
-                _session_records[str(review_message.id)] = review_ctx.to_dict()
-                _save_sessions()
+                review_message = await review_ch.send(desc, view=_flow_view("review"))
+                # Nur der Datensatz wird gebraucht; ReviewView liest ihn über die message_id.
+                _set_session(int(review_message.id), {
+                    **ctx.to_dict(),
+                    "message_id": int(review_message.id),
+                    "stage": "review",
+                    "experienced": experienced,
+                    "created_at": time.time(),
+                })
 
                 await inter.edit_original_response(
                     content="✅ Danke! Deine Angaben wurden zur **Prüfung** an die Gildenleitung gesendet.",
                     view=None
                 )
             else:
+                # Das Mitglied wird nur für die Rollenvergabe gebraucht; im Review-Zweig
+                # reicht die ID für die Erwähnung und der REST-Fallback entfällt.
+                member = await _resolve_member(inter.client, guild, ctx.member_id)
+
+                pending = [inter.edit_original_response(content="✅ Danke! Deine Rollen wurden vergeben.", view=None)]
                 if member:
-                    roles = await _assign_roles(member, self.ctx.category, self.ctx.primary, experienced)
+                    roles = await _assign_roles(member, ctx.category, ctx.primary, experienced)
 
                     if review_ch:
-                        await review_ch.send(
-                            f"📝 **Auto-Onboarding:** {member.mention} – {cat_txt}, {pri_txt}, {exp_txt}\n"
-                            f"Rollen: {', '.join(r.mention for r in roles) if roles else '—'}"
-                        )
+                        pending.append(review_ch.send(_AUTO_LOG_TMPL.format(
+                            mention=member.mention,
+                            cat=cat_txt,
+                            pri=pri_txt,
+                            exp=exp_txt,
+                            roles=", ".join(r.mention for r in roles) if roles else "—",
+                        )))
 
-                await inter.edit_original_response(content="✅ Danke! Deine Rollen wurden vergeben.", view=None)
+                edited, *_ = await asyncio.gather(*pending, return_exceptions=True)
+                if isinstance(edited, BaseException):
+                    raise edited
 
-            _forget_message(self.ctx.message_id or (inter.message.id if inter.message else 0))
+            _forget_message(ctx.message_id)
 
         except Exception as e:
             try:
@@ -420,10 +807,10 @@ class ExperienceView(View):
                     await inter.response.send_message(f"❌ Fehler im Onboarding: {e}", ephemeral=True)
                 else:
                     await inter.followup.send(f"❌ Fehler im Onboarding: {e}", ephemeral=True)
-            except Exception:
+            except discord.HTTPException:
                 pass
 
-            print(f"[onboarding] ExperienceView _finish Fehler: {e!r}")
+            log.warning("ExperienceView _finish Fehler: %r", e)
 
     @button(label="🧠 Erfahren", style=ButtonStyle.primary, custom_id="onboarding_experience_yes")
     async def btn_exp(self, inter: discord.Interaction, _):
@@ -433,24 +820,97 @@ class ExperienceView(View):
     async def btn_new(self, inter: discord.Interaction, _):
         await self._finish(inter, False)
 
-async def send_onboarding_dm(member: discord.Member) -> tuple[bool, str]:
+
+_FLOW_VIEW_TYPES: dict[str, type[View]] = {
+    "category": CategoryView,
+    "primary": PrimaryView,
+    "experience": ExperienceView,
+    "review": ReviewView,
+}
+
+# Onboarding-DMs laufen über eine Warteschlange mit einem einzigen Sender, damit
+# ein Join-Schwall nicht sofort in den globalen DM-Bucket (5/5s) läuft.
+_DM_INTERVAL = 0.25
+_DM_MAX_ATTEMPTS = 3
+_dm_queue: Optional[asyncio.Queue] = None
+_dm_worker_task: Optional[asyncio.Task] = None
+
+async def _dm_worker() -> None:
+    while True:
+        target, kwargs, fut = await _dm_queue.get()
+        try:
+            for attempt in range(_DM_MAX_ATTEMPTS):
+                if fut.done():
+                    break
+                try:
+                    message = await target.send(**kwargs)
+                except discord.HTTPException as exc:
+                    if exc.status == 429 and attempt + 1 < _DM_MAX_ATTEMPTS:
+                        await asyncio.sleep(float(getattr(exc, "retry_after", 0) or 1.0))
+                        continue
+                    if not fut.done():
+                        fut.set_exception(exc)
+                else:
+                    if not fut.done():
+                        fut.set_result(message)
+                break
+        except Exception as exc:
+            if not fut.done():
+                fut.set_exception(exc)
+        finally:
+            _dm_queue.task_done()
+        await asyncio.sleep(_DM_INTERVAL)
+
+async def _queue_dm(target: discord.abc.Messageable, **kwargs) -> discord.Message:
+    global _dm_queue, _dm_worker_task
+    loop = asyncio.get_running_loop()
+    if _dm_queue is None:
+        _dm_queue = asyncio.Queue()
+    if _dm_worker_task is None or _dm_worker_task.done():
+        _dm_worker_task = loop.create_task(_dm_worker())
+    fut = loop.create_future()
+    await _dm_queue.put((target, kwargs, fut))
+    return await fut
+
+# Ohne Kategorie- und Primärrollen würde der DM-Ablauf nichts vergeben; die
+# Gildenleitung wird pro Server (und Prozesslauf) einmal darauf hingewiesen.
+_unconfigured_warned: set[int] = set()
+
+async def _warn_unconfigured(guild: discord.Guild) -> None:
+    if guild.id in _unconfigured_warned:
+        return
+    _unconfigured_warned.add(guild.id)
+    log.info("%s: keine Onboarding-Rollen gesetzt, DM übersprungen", guild.id)
+    ch = _review_channel(guild)
+    if ch is None:
+        return
     try:
-        if member.bot:
-            return False, "Botkonten werden nicht onboardet."
+        await ch.send("⚠️ Onboarding übersprungen: Es sind keine Rollen gesetzt. Bitte `/onboarding set_categories` bzw. `/onboarding set_primaries` ausführen.")
+    except discord.HTTPException:
+        pass
 
-        c = _gcfg(member.guild)
-        if not c.get("enabled", True):
-            return False, "Onboarding ist für diesen Server deaktiviert."
+async def send_onboarding_dm(member: discord.Member) -> tuple[bool, str]:
+    if member.bot:
+        return False, "Botkonten werden nicht onboardet."
+
+    if not _gcfg(member.guild).get("enabled", True):
+        return False, "Onboarding ist für diesen Server deaktiviert."
+
+    basket = _role_basket(member.guild)
+    if not basket.category and not basket.primary:
+        await _warn_unconfigured(member.guild)
+        return False, "Für diesen Server sind keine Onboarding-Rollen gesetzt."
+
+    try:
+        # Erst den DM-Kanal auflösen (member.send täte das ohnehin); Kontext,
+        # Text und View werden nur gebaut, wenn das geklappt hat.
+        dm_channel = member.dm_channel or await member.create_dm()
 
         _forget_member_sessions(member.id)
         ctx = StepContext(member.id, member.guild.id)
 
-        text = (
-            f"👋 **Willkommen {member.display_name}!**\n\n"
-            f"Wähle bitte zuerst deine **Kategorie**."
-        )
-
-        message = await member.send(text, view=CategoryView(ctx))
+        text = _WELCOME_TMPL.format(name=member.display_name)
+        message = await _queue_dm(dm_channel, content=text, view=_flow_view("category"))
         ctx.message_id = int(message.id)
         ctx.stage = "category"
         _remember_ctx(ctx)
@@ -459,7 +919,7 @@ async def send_onboarding_dm(member: discord.Member) -> tuple[bool, str]:
     except discord.Forbidden:
         return False, "DM konnte nicht zugestellt werden. Das Mitglied hat Direktnachrichten vermutlich deaktiviert."
     except Exception as exc:
-        print(f"[onboarding] DM an {getattr(member, 'id', 0)} fehlgeschlagen: {exc!r}", flush=True)
+        log.warning("DM an %s fehlgeschlagen: %r", getattr(member, "id", 0), exc)
         return False, f"{type(exc).__name__}: {str(exc)[:240]}"
 
 
@@ -469,48 +929,43 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         description="Mitglieder-Onboarding verwalten",
     )
     tree.add_command(onboarding_group)
+    setup_queued_logger(log)
 
-    # Persistente Onboarding- und Review-Buttons nach einem Neustart wieder anbinden.
-    for message_id, raw_ctx in list(_session_records.items()):
-        try:
-            ctx = StepContext.from_dict(raw_ctx)
-            mid = int(message_id)
-            if ctx.stage == "category":
-                client.add_view(CategoryView(ctx), message_id=mid)
-            elif ctx.stage == "primary":
-                client.add_view(PrimaryView(ctx), message_id=mid)
-            elif ctx.stage == "experience":
-                client.add_view(ExperienceView(ctx), message_id=mid)
-            elif ctx.stage == "review":
-                client.add_view(
-                    ReviewView(
-                        ctx.member_id,
-                        str(ctx.category or ""),
-                        str(ctx.primary or ""),
-                        bool(ctx.experienced),
-                        message_id=mid,
-                        guild_id=ctx.guild_id,
-                    ),
-                    message_id=mid,
-                )
-        except Exception as exc:
-            print(f"[onboarding] Persistente View {message_id} konnte nicht geladen werden: {exc!r}")
+    global _session_sweeper_task
+    if _session_sweeper_task is None or _session_sweeper_task.done():
+        _session_sweeper_task = asyncio.get_running_loop().create_task(_session_sweeper())
+
+    async def _on_guild_role_delete(role: discord.Role):
+        _role_cache.pop(role.guild.id, None)
+
+    # Nach einem Re-IDENTIFY ersetzt discord.py alle Guild-Objekte; gecachte Rollen
+    # hingen sonst an der alten Guild (samt Mitgliedern/Kanälen) und an altem Stand.
+    async def _on_ready():
+        _role_cache.clear()
+
+    async def _on_guild_available(guild: discord.Guild):
+        _role_cache.pop(guild.id, None)
+
+    if hasattr(client, "add_listener"):
+        client.add_listener(_on_guild_role_delete, "on_guild_role_delete")  # type: ignore[attr-defined]
+        client.add_listener(_on_ready, "on_ready")  # type: ignore[attr-defined]
+        client.add_listener(_on_guild_available, "on_guild_available")  # type: ignore[attr-defined]
+
+    # Alle Stufen hängen an festen custom_ids und brauchen nur je eine View,
+    # auch für Nachrichten von vor einem Neustart.
+    for stage in _FLOW_VIEW_TYPES:
+        client.add_view(_flow_view(stage))
 
     @onboarding_group.command(name="toggle", description="(Admin) Onboarding ein-/ausschalten")
     @app_commands.describe(enabled="true = an, false = aus")
+    @_admin_only
     async def onboarding_toggle(inter: discord.Interaction, enabled: bool):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        c["enabled"] = bool(enabled)
-        cfg[str(inter.guild_id)] = c
-        _save_cfg(cfg)
+        _update_cfg(inter.guild, enabled=bool(enabled))
 
         await inter.response.send_message(f"✅ Onboarding {'aktiviert' if enabled else 'deaktiviert'}.", ephemeral=True)
 
     @onboarding_group.command(name="set_categories", description="(Admin) Rollen für Kategorien setzen")
+    @_admin_only
     async def onboarding_set_categories(
         inter: discord.Interaction,
         gildenmitglied: discord.Role,
@@ -518,20 +973,12 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         freund: discord.Role,
         bewerber: discord.Role,
     ):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        c["category_roles"] = {
+        _update_cfg(inter.guild, category_roles={
             "guild": gildenmitglied.id,
             "ally": allianzmitglied.id,
             "friend": freund.id,
             "applicant": bewerber.id,
-        }
-
-        cfg[str(inter.guild_id)] = c
-        _save_cfg(cfg)
+        })
 
         await inter.response.send_message(
             f"✅ Kategorien gesetzt:\n"
@@ -543,20 +990,14 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         )
 
     @onboarding_group.command(name="set_primaries", description="(Admin) Primärrollen für Tank/Heal/DPS setzen")
+    @_admin_only
     async def onboarding_set_primaries(
         inter: discord.Interaction,
         tank: discord.Role,
         heal: discord.Role,
         dps: discord.Role
     ):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        c["primary_roles"] = {"TANK": tank.id, "HEAL": heal.id, "DPS": dps.id}
-        cfg[str(inter.guild_id)] = c
-        _save_cfg(cfg)
+        _update_cfg(inter.guild, primary_roles={"TANK": tank.id, "HEAL": heal.id, "DPS": dps.id})
 
         await inter.response.send_message(
             f"✅ Primärrollen gesetzt:\n• 🛡️ {tank.mention}\n• 💚 {heal.mention}\n• 🗡️ {dps.mention}",
@@ -564,23 +1005,16 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         )
 
     @onboarding_group.command(name="set_experience", description="(Admin) Rollen für Erfahren/Unerfahren setzen")
+    @_admin_only
     async def onboarding_set_experience(
         inter: discord.Interaction,
         experienced_role: Optional[discord.Role] = None,
         newbie_role: Optional[discord.Role] = None
     ):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        c["experience_roles"] = {
+        _update_cfg(inter.guild, experience_roles={
             "experienced": int(experienced_role.id) if experienced_role else 0,
             "newbie": int(newbie_role.id) if newbie_role else 0
-        }
-
-        cfg[str(inter.guild_id)] = c
-        _save_cfg(cfg)
+        })
 
         await inter.response.send_message(
             f"✅ Erfahrungsrollen gesetzt:\n"
@@ -590,16 +1024,10 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         )
 
     @onboarding_group.command(name="set_review_channel", description="(Admin) Kanal für Review/Logs setzen")
+    @_admin_only
     async def onboarding_set_review_channel(inter: discord.Interaction):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
         async def _picked(pick_inter: discord.Interaction, channel: discord.TextChannel):
-            c = _gcfg(pick_inter.guild)
-            c["review_channel"] = int(channel.id)
-            cfg[str(pick_inter.guild_id)] = c
-            _save_cfg(cfg)
+            _update_cfg(pick_inter.guild, review_channel=int(channel.id))
             await pick_inter.response.edit_message(
                 content=f"✅ Review-/Log-Kanal gesetzt: {channel.mention}",
                 view=None,
@@ -608,24 +1036,15 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
         await send_text_channel_picker(inter, "📝 Onboarding-Review-Kanal auswählen", _picked)
 
     @onboarding_group.command(name="require_review", description="(Admin) Review durch Staff erzwingen")
+    @_admin_only
     async def onboarding_require_review(inter: discord.Interaction, require: bool):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        c["require_review"] = bool(require)
-        cfg[str(inter.guild_id)] = c
-        _save_cfg(cfg)
+        _update_cfg(inter.guild, require_review=bool(require))
 
         await inter.response.send_message(f"✅ Review erforderlich: {'Ja' if require else 'Nein'}", ephemeral=True)
 
     @onboarding_group.command(name="send", description="(Admin) Onboarding-DM manuell an ein Mitglied senden")
+    @_admin_only
     async def onboarding_send(inter: discord.Interaction, member: discord.Member):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
         await inter.response.defer(ephemeral=True, thinking=True)
         ok, reason = await send_onboarding_dm(member)
         if ok:
@@ -634,37 +1053,41 @@ async def setup_onboarding(client: discord.Client, tree: app_commands.CommandTre
             await inter.followup.send(f"❌ Onboarding-DM an {member.mention} fehlgeschlagen: {reason}", ephemeral=True)
 
     @onboarding_group.command(name="status", description="(Admin) Zeigt aktuelle Onboarding-Konfiguration")
+    @_admin_only
     async def onboarding_status(inter: discord.Interaction):
-        if not _is_admin(inter):
-            await inter.response.send_message("Nur Admins.", ephemeral=True)
-            return
-
-        c = _gcfg(inter.guild)
-        cat = c.get("category_roles") or {}
-        pri = c.get("primary_roles") or {}
-        exp = c.get("experience_roles") or {}
-        rch = _review_channel(inter.guild)
-
-        def _m(rid):
-            r = _role(inter.guild, rid)
-            return r.mention if r else "—"
-
-        text = (
-            f"**Onboarding:** {'aktiv' if c.get('enabled', True) else 'inaktiv'}\n"
-            f"**Review erforderlich:** {'Ja' if c.get('require_review') else 'Nein'}\n"
-            f"**Review/Log-Kanal:** {rch.mention if rch else '—'}\n\n"
-            f"**Kategorien**\n"
-            f"• Gildenmitglied: {_m(cat.get('guild'))}\n"
-            f"• Allianzmitglied: {_m(cat.get('ally'))}\n"
-            f"• Freund: {_m(cat.get('friend'))}\n"
-            f"• Bewerber: {_m(cat.get('applicant'))}\n\n"
-            f"**Primärrollen**\n"
-            f"• 🛡️ {_m(pri.get('TANK'))}\n"
-            f"• 💚 {_m(pri.get('HEAL'))}\n"
-            f"• 🗡️ {_m(pri.get('DPS'))}\n\n"
-            f"**Erfahrung**\n"
-            f"• 🧠 {_m(exp.get('experienced'))}\n"
-            f"• 🌱 {_m(exp.get('newbie'))}"
-        )
+        guild = inter.guild
+        c = _gcfg(guild)
+        # Dieselben aufgelösten Rollen wie bei der Vergabe; fehlende Rollen fehlen im Korb.
+        basket = _role_basket(guild)
+        cat = basket.category
+        pri = basket.primary
+        exp = basket.experience
+        rch = _review_channel(guild)
+        na = "—"
+
+        def _m(r):
+            return r.mention if r else na
+
+        parts = [
+            f"**Onboarding:** {'aktiv' if c.get('enabled', True) else 'inaktiv'}",
+            f"**Review erforderlich:** {'Ja' if c.get('require_review') else 'Nein'}",
+            f"**Review/Log-Kanal:** {rch.mention if rch else na}",
+            "",
+            "**Kategorien**",
+            "• Gildenmitglied: " + _m(cat.get("guild")),
+            "• Allianzmitglied: " + _m(cat.get("ally")),
+            "• Freund: " + _m(cat.get("friend")),
+            "• Bewerber: " + _m(cat.get("applicant")),
+            "",
+            "**Primärrollen**",
+            "• 🛡️ " + _m(pri.get("TANK")),
+            "• 💚 " + _m(pri.get("HEAL")),
+            "• 🗡️ " + _m(pri.get("DPS")),
+            "",
+            "**Erfahrung**",
+            "• 🧠 " + _m(exp.get(True)),
+            "• 🌱 " + _m(exp.get(False)),
+        ]
+        text = "\n".join(parts)
 
         await inter.response.send_message(text, ephemeral=True)
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+from threading import Lock
+
+# Ein gemeinsamer Listener-Thread schreibt alle Modul-Logs nach stdout, damit der
+# Event-Loop nicht bei jeder Zeile synchron auf stdout wartet.
+_listener: logging.handlers.QueueListener | None = None
+_queue: queue.SimpleQueue = queue.SimpleQueue()
+_setup_lock = Lock()
+
+
+def _ensure_listener() -> None:
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("[%(name)s] %(message)s"))
+        _listener = logging.handlers.QueueListener(_queue, handler)
+        _listener.start()
+        # Beim Beenden die Queue leeren, sonst gehen die letzten Zeilen verloren.
+        atexit.register(_listener.stop)
+
+
+def setup_queued_logger(log: logging.Logger) -> None:
+    """Hängt log an die gemeinsame Queue; mehrfacher Aufruf ist unschädlich."""
+    _ensure_listener()
+    if not any(isinstance(h, logging.handlers.QueueHandler) for h in log.handlers):
+        log.addHandler(logging.handlers.QueueHandler(_queue))
+    log.setLevel(logging.INFO)
+    log.propagate = False